@@ -3,63 +3,112 @@ Module for exporting Live Photos back to files
 Copies original files to export directory for transfer to iPhone
 """
 import os
+import queue
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List
 import sqlite3
 
+from core.fileops import fastcopy
+
 
 class Exporter:
+    # Number of threads copying files concurrently during export
+    EXPORT_WORKERS = 4
+    
+    # Export directories with more files than this are cleared in parallel
+    PARALLEL_UNLINK_THRESHOLD = 256
+    
     def __init__(self, library_path: str, db_path: str, export_path: str):
         self.library_path = Path(library_path)
         self.db_path = Path(db_path)
         self.export_path = Path(export_path)
+        # Plain string form for building paths in the export loop
+        self._export_str = os.fspath(self.export_path)
         self.export_path.mkdir(parents=True, exist_ok=True)
     
     def export_photos(self, photo_ids: List[int]) -> bool:
         """
         Export selected photos to the export directory
         Copies both image and video files if they exist
+        Rows are streamed from the database to a pool of copy workers
         """
         try:
             # Get photo information from database
             conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            placeholders = ','.join(['?' for _ in photo_ids])
-            cursor.execute(f'''
-                SELECT id, filename, filepath, video_filename FROM photos WHERE id IN ({placeholders})
-            ''', photo_ids)
-            
-            rows = cursor.fetchall()
-            conn.close()
-            
-            exported_count = 0
-            for row in rows:
-                photo_id, filename, filepath, video_filename = row
+            try:
+                cursor = conn.cursor()
                 
-                # Copy image file
-                src_image_path = Path(filepath)
-                dst_image_path = self.export_path / filename
+                placeholders = ','.join(['?' for _ in photo_ids])
+                cursor.execute(f'''
+                    SELECT id, filename, filepath, video_filename FROM photos WHERE id IN ({placeholders})
+                ''', photo_ids)
                 
-                if src_image_path.exists():
-                    shutil.copy2(src_image_path, dst_image_path)
+                # One queue per worker, see the routing below
+                row_queues = [queue.Queue(maxsize=8) for _ in range(self.EXPORT_WORKERS)]
+                counter_lock = threading.Lock()
+                state = {'exported_count': 0, 'error': None}
                 
-                # Copy video file if it exists
-                if video_filename:
-                    src_video_path = src_image_path.parent / video_filename
-                    dst_video_path = self.export_path / video_filename
-                    
-                    if src_video_path.exists():
-                        shutil.copy2(src_video_path, dst_video_path)
+                def copy_worker(row_queue):
+                    while True:
+                        row = row_queue.get()
+                        if row is None:
+                            return
+                        # After a failure keep draining so the producer never blocks
+                        if state['error'] is not None:
+                            continue
+                        try:
+                            self._export_row(*row)
+                        except Exception as e:
+                            state['error'] = e
+                            continue
+                        with counter_lock:
+                            state['exported_count'] += 1
                 
-                exported_count += 1
+                with ThreadPoolExecutor(max_workers=self.EXPORT_WORKERS) as executor:
+                    for row_queue in row_queues:
+                        executor.submit(copy_worker, row_queue)
+                    try:
+                        for row in cursor:
+                            # Records sharing an export name (same image stem, so also the
+                            # same video name) go to the same worker in query order,
+                            # the destination is never written by two threads at once
+                            name_key = os.path.splitext(row[1])[0].lower()
+                            row_queues[hash(name_key) % len(row_queues)].put(row)
+                    finally:
+                        for row_queue in row_queues:
+                            row_queue.put(None)
+            finally:
+                conn.close()
+            
+            if state['error'] is not None:
+                raise state['error']
             
             return True
         except Exception as e:
             print(f"Error exporting photos: {e}")
             return False
     
+    def _export_row(self, photo_id: int, filename: str, filepath: str, video_filename: str):
+        """
+        Copy image and video file of one photo to the export directory
+        """
+        # Copy image file
+        dst_image_path = os.path.join(self._export_str, filename)
+        
+        if os.path.exists(filepath):
+            fastcopy(filepath, dst_image_path)
+        
+        # Copy video file if it exists
+        if video_filename:
+            src_video_path = os.path.join(os.path.dirname(filepath), video_filename)
+            dst_video_path = os.path.join(self._export_str, video_filename)
+            
+            if os.path.exists(src_video_path):
+                fastcopy(src_video_path, dst_video_path)
+    
     def get_export_directory(self) -> str:
         """
         Get the path to the export directory
@@ -70,8 +119,18 @@ class Exporter:
         """
         Clear all files from the export directory
         """
-        for item in self.export_path.iterdir():
-            if item.is_file():
-                item.unlink()
-            elif item.is_dir():
-                shutil.rmtree(item)
\ No newline at end of file
+        files = []
+        with os.scandir(self.export_path) as entries:
+            for entry in entries:
+                # File type comes from the directory listing, no extra stat
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    files.append(entry.path)
+        
+        if len(files) > self.PARALLEL_UNLINK_THRESHOLD:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(os.unlink, files))
+        else:
+            for path in files:
+                os.unlink(path)
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Module with low-level file operations shared by importer and exporter
+Keeps large Live Photo copies inside the kernel where the platform allows it
+"""
+import errno
+import os
+import shutil
+import sys
+
+
+# Errors meaning copy_file_range cannot be used for this pair of files
+_COPY_FILE_RANGE_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM}
+
+
+def fastcopy(src, dst):
+    """
+    Copy file contents and metadata from src to dst (like shutil.copy2)
+    Uses copy_file_range on Linux (reflinks / server-side copy), sendfile as
+    fallback and CopyFileW on Windows
+    """
+    src = os.fspath(src)
+    dst = os.fspath(dst)
+
+    # Opening dst for writing would truncate src, fail like shutil.copy2
+    if _same_file(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+
+    if sys.platform == 'win32':
+        _copy_windows(src, dst)
+    else:
+        _copy_posix(src, dst)
+
+    shutil.copystat(src, dst)
+
+
+def _same_file(src: str, dst: str) -> bool:
+    """
+    Check if src and dst are the same file (a missing dst is not)
+    """
+    try:
+        return os.path.samefile(src, dst)
+    except OSError:
+        return False
+
+
+def _copy_windows(src: str, dst: str):
+    """
+    Copy file with the native CopyFileW call
+    """
+    import ctypes
+
+    if not ctypes.windll.kernel32.CopyFileW(src, dst, False):
+        raise ctypes.WinError()
+
+
+def _copy_posix(src: str, dst: str):
+    """
+    Copy file with copy_file_range, falling back to sendfile into a
+    preallocated file and finally to shutil.copyfile if the kernel supports neither
+    """
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    _copy_file_range(src_fd, dst_fd, size)
+                    return
+                except OSError as e:
+                    if e.errno not in _COPY_FILE_RANGE_UNSUPPORTED:
+                        raise
+                    # Nothing usable was written, start over from offset 0
+                    os.lseek(src_fd, 0, os.SEEK_SET)
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+                    os.ftruncate(dst_fd, 0)
+
+            try:
+                _preallocate(dst_fd, size)
+                _sendfile(src_fd, dst_fd, size)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP):
+                    raise
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    shutil.copyfile(src, dst)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int):
+    """
+    Copy size bytes between descriptors with os.copy_file_range
+    """
+    remaining = size
+    while remaining > 0:
+        copied = os.copy_file_range(src_fd, dst_fd, remaining)
+        if copied == 0:
+            break
+        remaining -= copied
+
+
+def _preallocate(fd: int, size: int):
+    """
+    Reserve size bytes for the destination file to avoid fragmentation
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        # Not supported by the filesystem, the copy works without it
+        pass
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int):
+    """
+    Copy size bytes between descriptors with os.sendfile
+    """
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
@@ -2,60 +2,136 @@
 Module for importing Live Photos from iPhone
 Handles both single .HEIC files with embedded video and pairs of .HEIC + .MOV files
 """
+import mmap
 import os
-import shutil
+import struct
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 import pyheif
 from PIL import Image
 import sqlite3
 from datetime import datetime
 
+from core.fileops import fastcopy
+
+
+# HEIF item types of an embedded Live Photo video track
+_HEIF_VIDEO_ITEM_TYPES = {b'vid ', b'vide'}
+
+
+def _iter_boxes(buf, start: int, end: int):
+    """
+    Iterate ISO-BMFF boxes in buf[start:end]
+    Yields (box_type, payload_start, box_end)
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', buf, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', buf, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise ValueError(f"Malformed box {box_type!r} at offset {offset}")
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _heif_has_video_item(buf) -> Optional[bool]:
+    """
+    Check HEIF item tables (meta/iinf/iref) for a video item linked to another item
+    Returns None if buf is not a parsable HEIF container
+    """
+    try:
+        boxes = {box_type: (start, end) for box_type, start, end in _iter_boxes(buf, 0, len(buf))
+                 if box_type in (b'ftyp', b'meta')}
+        if b'ftyp' not in boxes or b'meta' not in boxes:
+            return None
+        
+        # meta is a FullBox: skip version and flags
+        meta_start, meta_end = boxes[b'meta']
+        item_types = {}
+        references = []
+        for box_type, start, end in _iter_boxes(buf, meta_start + 4, meta_end):
+            if box_type == b'iinf':
+                version = buf[start]
+                entries_start = start + (6 if version == 0 else 8)
+                for entry_type, entry_start, _ in _iter_boxes(buf, entries_start, end):
+                    if entry_type != b'infe' or buf[entry_start] < 2:
+                        continue
+                    if buf[entry_start] == 2:
+                        item_id, _, item_type = struct.unpack_from('>HH4s', buf, entry_start + 4)
+                    else:
+                        item_id, _, item_type = struct.unpack_from('>IH4s', buf, entry_start + 4)
+                    item_types[item_id] = item_type
+            elif box_type == b'iref':
+                id_format = '>H' if buf[start] == 0 else '>I'
+                id_size = struct.calcsize(id_format)
+                for ref_type, ref_start, _ in _iter_boxes(buf, start + 4, end):
+                    from_id = struct.unpack_from(id_format, buf, ref_start)[0]
+                    count = struct.unpack_from('>H', buf, ref_start + id_size)[0]
+                    to_start = ref_start + id_size + 2
+                    for i in range(count):
+                        to_id = struct.unpack_from(id_format, buf, to_start + i * id_size)[0]
+                        references.append((ref_type, from_id, to_id))
+    except (struct.error, ValueError, IndexError):
+        return None
+    
+    # A video item linked to the image, or an hvc1 item used as content description
+    for ref_type, from_id, to_id in references:
+        if from_id == to_id or to_id not in item_types:
+            continue
+        from_type = item_types.get(from_id)
+        if ref_type in (b'cdsc', b'auxl') and from_type in _HEIF_VIDEO_ITEM_TYPES:
+            return True
+        if ref_type == b'cdsc' and from_type == b'hvc1':
+            return True
+    return False
+
 
 class Importer:
+    # Number of photo records inserted per transaction during import
+    DB_BATCH_SIZE = 500
+    
     def __init__(self, library_path: str, db_path: str):
         self.library_path = Path(library_path)
         self.db_path = Path(db_path)
+        # Plain string form for building paths in the import loop
+        self._library_str = os.fspath(self.library_path)
+        # Year/month folders already created by this importer
+        self._ensured_dirs: set[str] = set()
+        # Record ids added by the last import_to_library call, in import order
+        self.last_import_ids: List[int] = []
         
     def scan_for_live_photos(self, source_path: str) -> List[dict]:
         """
         Scan source directory for Live Photo pairs or single HEIC files
         Returns list of dictionaries with photo information
         """
-        source_path = Path(source_path)
         live_photos = []
         
-        # Find all potential Live Photo files
-        heic_files = list(source_path.rglob("*.HEIC"))
-        mov_files = list(source_path.rglob("*.MOV"))
-        
-        # Group files by base name (without extension)
-        file_groups = {}
-        
-        for file in heic_files + mov_files:
-            # Get base name without extension (e.g., IMG_1234)
-            base_name = file.stem
-            if base_name.startswith('.'):
-                continue
-                
-            if base_name not in file_groups:
-                file_groups[base_name] = {'HEIC': None, 'MOV': None}
-            
-            if file.suffix.upper() == '.HEIC':
-                file_groups[base_name]['HEIC'] = file
-            elif file.suffix.upper() == '.MOV':
-                file_groups[base_name]['MOV'] = file
+        # Group files by base name (without extension, e.g. IMG_1234)
+        file_groups = self._group_files_by_name(os.fspath(source_path))
         
         # Process each group to identify Live Photos
         for base_name, files in file_groups.items():
+            # Materialize Path objects only for files we keep
+            if files['HEIC']:
+                files['HEIC'] = Path(files['HEIC'])
             if files['HEIC'] and files['MOV']:
                 # This is a Live Photo pair
                 live_photo_data = {
                     'type': 'pair',
                     'image_path': files['HEIC'],
-                    'video_path': files['MOV'],
+                    'video_path': Path(files['MOV']),
                     'base_name': base_name,
-                    'timestamp': self._get_file_timestamp(files['HEIC'])
+                    'timestamp': self._get_file_timestamp(files['HEIC_stat']),
+                    'image_size': files['HEIC_stat'].st_size
                 }
                 live_photos.append(live_photo_data)
             elif files['HEIC']:
@@ -66,16 +142,84 @@ class Importer:
                         'image_path': files['HEIC'],
                         'video_path': None,  # Will be extracted during processing
                         'base_name': base_name,
-                        'timestamp': self._get_file_timestamp(files['HEIC'])
+                        'timestamp': self._get_file_timestamp(files['HEIC_stat']),
+                        'image_size': files['HEIC_stat'].st_size
                     }
                     live_photos.append(live_photo_data)
         
         return live_photos
     
+    def _group_files_by_name(self, source_path: str) -> Dict[str, dict]:
+        """
+        Walk source directory tree in parallel and group .HEIC/.MOV files by base name
+        Returns {base_name: {'HEIC': path or None, 'MOV': path or None, 'HEIC_stat': stat_result or None}}
+        """
+        file_groups = defaultdict(lambda: {'HEIC': None, 'MOV': None, 'HEIC_stat': None})
+        groups_lock = threading.Lock()
+        
+        def scan_directory(dir_path: str) -> List[str]:
+            """Collect Live Photo files of one directory, return its subdirectories"""
+            subdirs = []
+            found = []
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        # Inspect the extension on the plain name string
+                        base_name, ext = os.path.splitext(entry.name)
+                        ext = ext[1:].upper()
+                        if ext == 'MOV' and not base_name.startswith('.'):
+                            found.append((base_name, ext, entry.path, None))
+                        elif ext == 'HEIC' and not base_name.startswith('.'):
+                            # Keep the entry's stat for timestamp and size
+                            try:
+                                found.append((base_name, ext, entry.path, entry.stat()))
+                            except OSError:
+                                continue
+            except OSError:
+                return subdirs
+            
+            if found:
+                with groups_lock:
+                    for base_name, ext, path, stat in found:
+                        file_groups[base_name][ext] = path
+                        if stat is not None:
+                            file_groups[base_name]['HEIC_stat'] = stat
+            return subdirs
+        
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            pending = {executor.submit(scan_directory, source_path)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for subdir in future.result():
+                        pending.add(executor.submit(scan_directory, subdir))
+        
+        return file_groups
+    
     def _has_embedded_video(self, heic_path: Path) -> bool:
         """
         Check if HEIC file has embedded video (Live Photo)
+        Parses only the HEIF box tree from a memory map, decoding with pyheif
+        only if the container could not be parsed
         """
+        try:
+            with open(heic_path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                # Only a few header pages are touched, skip read-ahead
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_RANDOM'):
+                    mm.madvise(mmap.MADV_RANDOM)
+                has_video = _heif_has_video_item(mm)
+            finally:
+                mm.close()
+            if has_video is not None:
+                return has_video
+        except (OSError, ValueError):
+            pass
+        
         try:
             # Attempt to read HEIF file to check for embedded video
             heif_file = pyheif.read(heif_file=str(heic_path))
@@ -88,56 +232,88 @@ class Importer:
         except Exception:
             return False
     
-    def _get_file_timestamp(self, file_path: Path) -> datetime:
+    def _get_file_timestamp(self, stat: os.stat_result) -> datetime:
         """
-        Get file creation/modification timestamp
+        Get file creation/modification timestamp from its stat result
         """
-        stat = file_path.stat()
         return datetime.fromtimestamp(max(stat.st_ctime, stat.st_mtime))
     
     def import_to_library(self, source_path: str, callback=None) -> int:
         """
         Import Live Photos from source to library
         Calls callback with progress updates if provided
-        Returns number of imported photos
+        Returns number of imported photos, their record ids are kept in last_import_ids
         """
         live_photos = self.scan_for_live_photos(source_path)
         imported_count = 0
+        self.last_import_ids = []
         
-        for i, live_photo in enumerate(live_photos):
-            # Create destination folder based on timestamp
-            timestamp = live_photo['timestamp']
-            year_month_folder = self.library_path / str(timestamp.year) / f"{timestamp.month:02d}"
-            year_month_folder.mkdir(parents=True, exist_ok=True)
-            
-            # Copy image file
-            dest_image_path = year_month_folder / live_photo['image_path'].name
-            shutil.copy2(live_photo['image_path'], dest_image_path)
-            
-            # Handle video file if it exists
-            dest_video_path = None
-            if live_photo['type'] == 'pair' and live_photo['video_path']:
-                dest_video_path = year_month_folder / live_photo['video_path'].name
-                shutil.copy2(live_photo['video_path'], dest_video_path)
-            elif live_photo['type'] == 'single':
-                # Extract embedded video if present
-                video_extracted = self._extract_video_from_heic(live_photo['image_path'], year_month_folder)
-                if video_extracted:
-                    dest_video_path = video_extracted
-            
-            # Add to database
-            self._add_to_database(
-                dest_image_path.name,
-                timestamp,
-                dest_video_path is not None,
-                dest_video_path.name if dest_video_path else None
-            )
-            
-            imported_count += 1
-            
-            # Report progress
-            if callback:
-                callback(i + 1, len(live_photos))
+        # One connection and one transaction per batch instead of per photo
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        rows = []
+        
+        def flush():
+            self.last_import_ids.extend(self._add_to_database(conn, rows))
+            rows.clear()
+        
+        try:
+            for i, live_photo in enumerate(live_photos):
+                # Create destination folder based on timestamp, once per folder
+                timestamp = live_photo['timestamp']
+                year_month_folder = os.path.join(self._library_str, str(timestamp.year), f"{timestamp.month:02d}")
+                if year_month_folder not in self._ensured_dirs:
+                    os.makedirs(year_month_folder, exist_ok=True)
+                    self._ensured_dirs.add(year_month_folder)
+                
+                # Copy image file
+                image_name = live_photo['image_path'].name
+                dest_image_path = os.path.join(year_month_folder, image_name)
+                fastcopy(live_photo['image_path'], dest_image_path)
+                
+                # Handle video file if it exists
+                dest_video_path = None
+                video_name = None
+                if live_photo['type'] == 'pair' and live_photo['video_path']:
+                    video_name = live_photo['video_path'].name
+                    dest_video_path = os.path.join(year_month_folder, video_name)
+                    fastcopy(live_photo['video_path'], dest_video_path)
+                elif live_photo['type'] == 'single':
+                    # Extract embedded video if present
+                    video_extracted = self._extract_video_from_heic(live_photo['image_path'], Path(year_month_folder))
+                    if video_extracted:
+                        dest_video_path = os.fspath(video_extracted)
+                        video_name = video_extracted.name
+                
+                # Size of the Live Photo on disk, stored for library statistics
+                file_size = live_photo['image_size']
+                if dest_video_path is not None:
+                    file_size += os.stat(dest_video_path).st_size
+                
+                # Queue database row, flushed in batches
+                rows.append((
+                    image_name,
+                    dest_image_path,
+                    timestamp,
+                    dest_video_path is not None,
+                    video_name,
+                    file_size,
+                    dest_video_path
+                ))
+                if len(rows) >= self.DB_BATCH_SIZE:
+                    flush()
+                
+                imported_count += 1
+                
+                # Report progress
+                if callback:
+                    callback(i + 1, len(live_photos))
+        finally:
+            # Keep records for files that were already copied
+            if rows:
+                flush()
+            conn.close()
         
         return imported_count
     
@@ -154,32 +330,21 @@ class Importer:
         except Exception:
             return None
     
-    def _add_to_database(self, filename: str, timestamp: datetime, has_video: bool, video_filename: str = None):
+    def _add_to_database(self, conn: sqlite3.Connection, rows: List[tuple]) -> List[int]:
         """
-        Add photo information to SQLite database
+        Add a batch of photo records to SQLite database in one transaction
+        Each row is (filename, filepath, timestamp, has_video, video_filename, file_size, video_path)
+        Returns ids of the new records in row order
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS photos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                filepath TEXT,
-                timestamp DATETIME,
-                has_video BOOLEAN,
-                video_filename TEXT,
-                duration REAL DEFAULT 0
-            )
-        ''')
-        
-        # Insert photo record
-        cursor.execute('''
-            INSERT INTO photos (filename, filepath, timestamp, has_video, video_filename)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (filename, str(self.library_path / timestamp.strftime('%Y/%m') / filename), 
-              timestamp, has_video, video_filename))
-        
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        photo_ids = []
+        with conn:
+            cursor = conn.cursor()
+            # executemany does not report per-row ids, so run the cached
+            # prepared statement once per row inside the transaction
+            for row in rows:
+                cursor.execute('''
+                    INSERT INTO photos (filename, filepath, timestamp, has_video, video_filename, file_size, video_path)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', row)
+                photo_ids.append(cursor.lastrowid)
+        return photo_ids
\ No newline at end of file
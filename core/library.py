@@ -4,20 +4,98 @@ Handles database operations and file system organization
 """
 import sqlite3
 import os
+import sys
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
 from datetime import datetime
 
+try:
+    from send2trash import send2trash
+except ImportError:
+    # If send2trash is not available, files are removed permanently
+    send2trash = None
+
 
 class LibraryManager:
+    # Maximum number of ids bound into a single IN (...) clause
+    SQL_BATCH_SIZE = 500
+    
     def __init__(self, library_path: str, db_path: str):
         self.library_path = Path(library_path)
         self.db_path = Path(db_path)
+        
+        # One long-lived connection per thread (GUI and photo loading worker)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        # Full-text index on filenames, if this SQLite build has FTS5
+        self._has_fts = False
         self.init_db()
     
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection of the calling thread, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, write transactions are opened with _transaction()
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            
+            # WAL journal lets readers run next to the importer writer,
+            # mmap gives zero-copy page reads
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if sys.platform != 'win32':
+                conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-32768")
+            
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements in one transaction of the calling thread's connection"""
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    
+    @contextmanager
+    def thread_connection(self):
+        """
+        Give the calling thread a connection for the enclosed block and close it afterwards,
+        for pool threads that may be retired while the manager lives on
+        """
+        conn = self._connection()
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            with self._connections_lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+    
+    def close(self):
+        """Close the connections of all threads"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+    
     def init_db(self):
         """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -28,45 +106,224 @@ class LibraryManager:
                 timestamp DATETIME,
                 has_video BOOLEAN,
                 video_filename TEXT,
-                duration REAL DEFAULT 0
+                duration REAL DEFAULT 0,
+                file_size INTEGER,
+                video_path TEXT
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Migrate databases created before file sizes and video paths were stored
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(photos)")]
+        if 'file_size' not in columns:
+            cursor.execute("ALTER TABLE photos ADD COLUMN file_size INTEGER")
+        if 'video_path' not in columns:
+            cursor.execute("ALTER TABLE photos ADD COLUMN video_path TEXT")
+        
+        # Indexes for sorting by date, filename search and live photo counts
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_photos_ts ON photos(timestamp DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_photos_fn ON photos(filename)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_photos_video ON photos(has_video) WHERE has_video = 1")
+        
+        self._init_fts(conn)
+        self._backfill_file_sizes(conn)
+        self._backfill_video_paths(conn)
+        self._init_stats(conn)
     
-    def get_all_photos(self, sort_by='timestamp DESC') -> List[Dict]:
-        """Get all photos from the library"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _init_stats(self, conn: sqlite3.Connection):
+        """Create the single-row statistics table kept up to date by triggers"""
+        with self._transaction():
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS photo_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_photos INTEGER NOT NULL,
+                    live_photos INTEGER NOT NULL,
+                    total_size INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS photo_stats_insert AFTER INSERT ON photos BEGIN
+                    UPDATE photo_stats SET total_photos = total_photos + 1,
+                                           live_photos = live_photos + (new.has_video = 1),
+                                           total_size = total_size + COALESCE(new.file_size, 0)
+                    WHERE id = 1;
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS photo_stats_delete AFTER DELETE ON photos BEGIN
+                    UPDATE photo_stats SET total_photos = total_photos - 1,
+                                           live_photos = live_photos - (old.has_video = 1),
+                                           total_size = total_size - COALESCE(old.file_size, 0)
+                    WHERE id = 1;
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS photo_stats_update AFTER UPDATE OF has_video, file_size ON photos BEGIN
+                    UPDATE photo_stats SET live_photos = live_photos + (new.has_video = 1) - (old.has_video = 1),
+                                           total_size = total_size + COALESCE(new.file_size, 0) - COALESCE(old.file_size, 0)
+                    WHERE id = 1;
+                END
+            ''')
+            
+            # Seed the row from the existing records once
+            conn.execute('''
+                INSERT OR IGNORE INTO photo_stats (id, total_photos, live_photos, total_size)
+                SELECT 1, COUNT(*), COUNT(*) FILTER (WHERE has_video = 1), COALESCE(SUM(file_size), 0)
+                FROM photos
+            ''')
+    
+    def _init_fts(self, conn: sqlite3.Connection):
+        """
+        Create the FTS5 filename index kept in sync with photos by triggers
+        The trigram tokenizer (SQLite 3.34+) keeps the substring semantics of LIKE
+        """
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'photos_fts'"
+        ).fetchone()
+        exists = row is not None and 'trigram' in row[0]
+        try:
+            with self._transaction():
+                # Replace an index created with the word tokenizer
+                if row is not None and not exists:
+                    conn.execute("DROP TABLE photos_fts")
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS photos_fts "
+                    "USING fts5(filename, content='photos', content_rowid='id', tokenize='trigram')"
+                )
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS photos_fts_insert AFTER INSERT ON photos BEGIN
+                        INSERT INTO photos_fts(rowid, filename) VALUES (new.id, new.filename);
+                    END
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS photos_fts_delete AFTER DELETE ON photos BEGIN
+                        INSERT INTO photos_fts(photos_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+                    END
+                ''')
+                conn.execute('''
+                    CREATE TRIGGER IF NOT EXISTS photos_fts_update AFTER UPDATE OF filename ON photos BEGIN
+                        INSERT INTO photos_fts(photos_fts, rowid, filename) VALUES ('delete', old.id, old.filename);
+                        INSERT INTO photos_fts(rowid, filename) VALUES (new.id, new.filename);
+                    END
+                ''')
+                
+                # Index records that existed before the full-text table
+                if not exists:
+                    conn.execute("INSERT INTO photos_fts(photos_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            # SQLite without FTS5 or the trigram tokenizer, search falls back to LIKE
+            return
+        self._has_fts = True
+    
+    def _filename_condition(self, query: str):
+        """Get the WHERE condition and parameter matching filenames against a search query"""
+        # Trigrams only index substrings of three or more characters
+        if self._has_fts and len(query) >= 3:
+            # Quote the query as one phrase so FTS syntax in it is matched literally
+            phrase = '"' + query.replace('"', '""') + '"'
+            return "id IN (SELECT rowid FROM photos_fts WHERE photos_fts MATCH ?)", phrase
+        return "filename LIKE ?", f"%{query}%"
+    
+    def _backfill_file_sizes(self, conn: sqlite3.Connection):
+        """Fill file_size of legacy records, reading each year/month folder once"""
+        rows = conn.execute(
+            "SELECT id, filepath, video_filename FROM photos WHERE file_size IS NULL AND filepath IS NOT NULL"
+        ).fetchall()
+        if not rows:
+            return
+        
+        folder_sizes = {}
+        updates = []
+        for photo_id, filepath, video_filename in rows:
+            folder, filename = os.path.split(filepath)
+            if folder not in folder_sizes:
+                folder_sizes[folder] = {}
+                try:
+                    with os.scandir(folder) as entries:
+                        for entry in entries:
+                            if entry.is_file():
+                                folder_sizes[folder][entry.name] = entry.stat().st_size
+                except OSError:
+                    pass
+            
+            sizes = folder_sizes[folder]
+            file_size = sizes.get(filename, 0)
+            if video_filename:
+                file_size += sizes.get(video_filename, 0)
+            updates.append((file_size, photo_id))
         
-        cursor.execute(f'''
+        with self._transaction():
+            conn.executemany("UPDATE photos SET file_size = ? WHERE id = ?", updates)
+    
+    def _backfill_video_paths(self, conn: sqlite3.Connection):
+        """Fill video_path of legacy records, the video is stored next to the image"""
+        rows = conn.execute(
+            "SELECT id, filepath, video_filename FROM photos "
+            "WHERE video_path IS NULL AND video_filename IS NOT NULL AND filepath IS NOT NULL"
+        ).fetchall()
+        if not rows:
+            return
+        
+        updates = [(os.path.join(os.path.dirname(filepath), video_filename), photo_id)
+                   for photo_id, filepath, video_filename in rows]
+        with self._transaction():
+            conn.executemany("UPDATE photos SET video_path = ? WHERE id = ?", updates)
+    
+    def get_all_photos(self, sort_by='timestamp DESC') -> Iterator[Dict]:
+        """
+        Get all photos from the library
+        Rows are streamed from the database while the caller iterates
+        """
+        cursor = self._connection().execute(f'''
             SELECT * FROM photos ORDER BY {sort_by}
         ''')
+        for row in cursor:
+            yield dict(row)
+    
+    def get_grid_rows(self, limit: int = -1, offset: int = 0, search: Optional[str] = None,
+                      date_range: Optional[tuple] = None) -> sqlite3.Cursor:
+        """
+        Get the columns the photo grid shows, newest first
+        The cursor is returned so the caller can page through it with fetchmany
+        """
+        where_conditions = []
+        params = []
         
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
+        if search:
+            condition, param = self._filename_condition(search)
+            where_conditions.append(condition)
+            params.append(param)
         
-        photos = []
-        for row in rows:
-            photo_dict = dict(zip(columns, row))
-            photos.append(photo_dict)
+        if date_range:
+            date_from, date_to = date_range
+            if date_from:
+                where_conditions.append("timestamp >= ?")
+                params.append(date_from.isoformat())
+            if date_to:
+                where_conditions.append("timestamp <= ?")
+                params.append(date_to.isoformat())
+        
+        # The SQL text only depends on the filters used, so sqlite3 reuses the
+        # prepared statement from its per-connection cache across calls
+        sql = "SELECT id, filepath, has_video, timestamp, video_path, file_size FROM photos"
+        if where_conditions:
+            sql += " WHERE " + " AND ".join(where_conditions)
+        sql += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
+        params.extend((limit, offset))
         
-        conn.close()
-        return photos
+        return self._connection().execute(sql, params)
     
     def search_photos(self, query: str = '', date_from: Optional[datetime] = None, 
                      date_to: Optional[datetime] = None) -> List[Dict]:
         """Search for photos by filename or date range"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._connection().cursor()
         
         where_conditions = []
         params = []
         
         if query:
-            where_conditions.append("filename LIKE ?")
-            params.append(f"%{query}%")
+            condition, param = self._filename_condition(query)
+            where_conditions.append(condition)
+            params.append(param)
         
         if date_from:
             where_conditions.append("timestamp >= ?")
@@ -85,33 +342,12 @@ class LibraryManager:
         sql += " ORDER BY timestamp DESC"
         
         cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        
-        photos = []
-        for row in rows:
-            photo_dict = dict(zip(columns, row))
-            photos.append(photo_dict)
-        
-        conn.close()
-        return photos
+        return [dict(row) for row in cursor]
     
     def get_photo_by_id(self, photo_id: int) -> Optional[Dict]:
         """Get a specific photo by ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM photos WHERE id = ?", (photo_id,))
-        row = cursor.fetchone()
-        
-        if row:
-            columns = [description[0] for description in cursor.description]
-            photo_dict = dict(zip(columns, row))
-            conn.close()
-            return photo_dict
-        
-        conn.close()
-        return None
+        row = self._connection().execute("SELECT * FROM photos WHERE id = ?", (photo_id,)).fetchone()
+        return dict(row) if row else None
     
     def delete_photo(self, photo_id: int) -> bool:
         """Delete a photo from library (move to trash)"""
@@ -120,67 +356,86 @@ class LibraryManager:
             if not photo:
                 return False
             
-            # Move file to trash using send2trash if available
-            try:
-                from send2trash import send2trash
-                if photo['filepath']:
-                    photo_path = Path(photo['filepath'])
-                    if photo_path.exists():
-                        send2trash(str(photo_path))
-                    
-                    # Also delete associated video if it exists
-                    if photo['video_filename']:
-                        video_path = photo_path.parent / photo['video_filename']
-                        if video_path.exists():
-                            send2trash(str(video_path))
-            except ImportError:
-                # If send2trash is not available, remove permanently
-                photo_path = Path(photo['filepath'])
-                if photo_path.exists():
-                    os.remove(str(photo_path))
-                
-                # Also delete associated video if it exists
-                if photo['video_filename']:
-                    video_path = photo_path.parent / photo['video_filename']
-                    if video_path.exists():
-                        os.remove(str(video_path))
+            self._remove_files(self._get_photo_files(photo))
             
             # Remove from database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM photos WHERE id = ?", (photo_id,))
-            conn.commit()
-            conn.close()
+            self._connection().execute("DELETE FROM photos WHERE id = ?", (photo_id,))
             
             return True
         except Exception:
             return False
     
-    def get_stats(self) -> Dict[str, int]:
-        """Get library statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM photos")
-        total_photos = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM photos WHERE has_video = 1")
-        live_photos = cursor.fetchone()[0]
-        
-        # Calculate total size
-        total_size = 0
-        photos = self.get_all_photos()
-        for photo in photos:
-            if photo['filepath'] and os.path.exists(photo['filepath']):
-                total_size += os.path.getsize(photo['filepath'])
+    def delete_photos(self, photo_ids: List[int]) -> bool:
+        """Delete several photos from library (move to trash) in one transaction"""
+        try:
+            conn = self._connection()
+            paths = []
+            for start in range(0, len(photo_ids), self.SQL_BATCH_SIZE):
+                batch = photo_ids[start:start + self.SQL_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                cursor = conn.execute(
+                    f"SELECT filepath, video_filename FROM photos WHERE id IN ({placeholders})", batch
+                )
+                for row in cursor:
+                    paths.extend(self._get_photo_files(row))
+            
+            # Several records may share files
+            self._remove_files(list(dict.fromkeys(paths)))
+            
+            # Remove from database
+            with self._transaction():
+                for start in range(0, len(photo_ids), self.SQL_BATCH_SIZE):
+                    batch = photo_ids[start:start + self.SQL_BATCH_SIZE]
+                    placeholders = ','.join('?' * len(batch))
+                    conn.execute(f"DELETE FROM photos WHERE id IN ({placeholders})", batch)
+            
+            return True
+        except Exception:
+            return False
+    
+    def _get_photo_files(self, photo) -> List[str]:
+        """Get image and video file paths of a photo record"""
+        paths = []
+        if photo['filepath']:
+            paths.append(photo['filepath'])
             
-            # Add video size if exists
+            # Also delete associated video
             if photo['video_filename']:
-                video_path = Path(photo['filepath']).parent / photo['video_filename']
-                if video_path.exists():
-                    total_size += os.path.getsize(str(video_path))
-        
-        conn.close()
+                paths.append(os.path.join(os.path.dirname(photo['filepath']), photo['video_filename']))
+        return paths
+    
+    def _remove_files(self, paths: List[str]):
+        """
+        Move files to trash using send2trash if available, otherwise remove permanently
+        Files that are already gone are skipped
+        """
+        if not paths:
+            return
+        if send2trash is not None:
+            try:
+                # send2trash accepts a list of paths and trashes them in one call
+                send2trash(paths)
+            except OSError:
+                # A missing file stops the bulk call, trash the rest one by one
+                for path in paths:
+                    try:
+                        send2trash(path)
+                    except OSError:
+                        if os.path.lexists(path):
+                            raise
+        else:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get library statistics, maintained by triggers on the photos table"""
+        cursor = self._connection().execute(
+            "SELECT total_photos, live_photos, total_size FROM photo_stats WHERE id = 1"
+        )
+        total_photos, live_photos, total_size = cursor.fetchone()
         
         return {
             'total_photos': total_photos,
@@ -191,9 +446,4 @@ class LibraryManager:
     
     def update_photo_duration(self, photo_id: int, duration: float):
         """Update the duration of a photo's video"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("UPDATE photos SET duration = ? WHERE id = ?", (duration, photo_id))
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        self._connection().execute("UPDATE photos SET duration = ? WHERE id = ?", (duration, photo_id))
\ No newline at end of file
@@ -3,13 +3,31 @@ Module for playing back Live Photos
 Handles video overlay animation on top of static image
 """
 import cv2
+import mmap
 import numpy as np
 from pathlib import Path
 from typing import Optional, Tuple
+import queue
 import threading
 import time
 
 
+def _open_capture(video_path: str) -> cv2.VideoCapture:
+    """
+    Open video with the FFmpeg backend and hardware decoding when available
+    (VideoToolbox, D3D11VA, VAAPI...), falling back to the default CPU path
+    """
+    try:
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+        if cap.isOpened():
+            return cap
+        cap.release()
+    except (cv2.error, AttributeError):
+        pass
+    return cv2.VideoCapture(video_path)
+
+
 class LivePhotoPlayer:
     def __init__(self):
         self.current_video_cap = None
@@ -25,7 +43,7 @@ class LivePhotoPlayer:
             if self.current_video_cap:
                 self.current_video_cap.release()
             
-            self.current_video_cap = cv2.VideoCapture(video_path)
+            self.current_video_cap = _open_capture(video_path)
             if not self.current_video_cap.isOpened():
                 return False
             
@@ -77,6 +95,17 @@ class LivePhotoPreview:
         self.image_path = None
         self.video_path = None
         self.is_loaded = False
+        
+        # Decoded frames handed from the decode thread to the animation loop
+        self._frame_queue = queue.Queue(maxsize=4)
+        self._stop_event = threading.Event()
+        
+        # Resize geometry and buffers, fixed for a loaded Live Photo
+        self._geometry_cache = {}
+        self._static_previews = {}
+        
+        # RGB animation frames preloaded with decode_frames(), (N, height, width, 3)
+        self.frames = None
     
     def load_live_photo(self, image_path: str, video_path: Optional[str] = None) -> bool:
         """
@@ -84,10 +113,11 @@ class LivePhotoPreview:
         """
         self.image_path = image_path
         self.video_path = video_path
+        self._reset_resize_cache()
         
         # Load static image
         try:
-            self.static_image = cv2.imread(image_path)
+            self.static_image = self._decode_image(image_path)
             if self.static_image is None:
                 return False
         except Exception:
@@ -104,34 +134,46 @@ class LivePhotoPreview:
         self.is_loaded = True
         return True
     
+    def _decode_image(self, image_path: str) -> Optional[np.ndarray]:
+        """
+        Decode image straight from a memory map of the file
+        """
+        with open(image_path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = None
+        try:
+            # The whole file is decoded, let the kernel read ahead
+            if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            buffer = np.frombuffer(mm, dtype=np.uint8)
+            return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        finally:
+            # The array must be released before the map can be closed
+            buffer = None
+            mm.close()
+    
     def get_static_preview(self, width: int = 160, height: int = 160) -> np.ndarray:
         """
         Get the static image preview (resized)
+        The result is cached per target size and must not be modified by callers
         """
         if not self.is_loaded:
             raise ValueError("Live Photo not loaded")
         
-        # Resize the image maintaining aspect ratio
-        h, w = self.static_image.shape[:2]
-        
-        # Calculate scaling factor to fit within the desired dimensions
-        scale_w = width / w
-        scale_h = height / h
-        scale = min(scale_w, scale_h)
-        
-        new_w = int(w * scale)
-        new_h = int(h * scale)
+        canvas = self._static_previews.get((width, height))
+        if canvas is not None:
+            return canvas
         
+        # Resize the image maintaining aspect ratio
+        new_w, new_h, y_offset, x_offset = self._fit_geometry(self.static_image.shape, width, height)
         resized = cv2.resize(self.static_image, (new_w, new_h), interpolation=cv2.INTER_AREA)
         
-        # Create a canvas of the target size with black background
-        canvas = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Center the resized image on the canvas
-        y_offset = (height - new_h) // 2
-        x_offset = (width - new_w) // 2
-        canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
+        # Center the resized image on a black canvas of the target size
+        canvas = cv2.copyMakeBorder(resized, y_offset, height - new_h - y_offset,
+                                    x_offset, width - new_w - x_offset,
+                                    cv2.BORDER_CONSTANT, value=(0, 0, 0))
         
+        self._static_previews[(width, height)] = canvas
         return canvas
     
     def get_video_frame(self, width: int = 160, height: int = 160) -> Optional[np.ndarray]:
@@ -145,59 +187,143 @@ class LivePhotoPreview:
         if frame is None:
             return self.get_static_preview(width, height)
         
-        # Resize the video frame to match the static image size
-        h, w = frame.shape[:2]
-        
-        # Calculate scaling factor to fit within the desired dimensions
-        scale_w = width / w
-        scale_h = height / h
-        scale = min(scale_w, scale_h)
-        
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-        
+        # Scale with area averaging (warpAffine would fall back to bilinear and
+        # alias on ~10x downscales) and center the frame on a black canvas
+        new_w, new_h, y_offset, x_offset = self._fit_geometry(frame.shape, width, height)
         resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+        return cv2.copyMakeBorder(resized, y_offset, height - new_h - y_offset,
+                                  x_offset, width - new_w - x_offset,
+                                  cv2.BORDER_CONSTANT, value=(0, 0, 0))
+    
+    def decode_frames(self, width: int = 160, height: int = 160,
+                      max_frames: int = 90) -> Optional[np.ndarray]:
+        """
+        Decode up to max_frames video frames, letterboxed to width x height and
+        converted to RGB, into one contiguous (N, height, width, 3) array
+        Uses its own capture, so it can run on a worker thread
+        """
+        video_path = self.video_path
+        if not video_path:
+            return None
         
-        # Create a canvas of the target size with black background
-        canvas = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Center the resized frame on the canvas
-        y_offset = (height - new_h) // 2
-        x_offset = (width - new_w) // 2
-        canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
+        # Zero-filled, so the letterbox borders are black already
+        frames = np.zeros((max_frames, height, width, 3), dtype=np.uint8)
+        count = 0
+        cap = _open_capture(video_path)
+        try:
+            while count < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                # Scale with area averaging, swap channels and center into the preallocated array
+                new_w, new_h, y_offset, x_offset = self._fit_geometry(frame.shape, width, height)
+                resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=resized)
+                frames[count, y_offset:y_offset + new_h, x_offset:x_offset + new_w] = resized
+                count += 1
+        finally:
+            cap.release()
         
-        return canvas
+        return frames[:count] if count else None
+    
+    def _fit_geometry(self, shape: Tuple[int, ...], width: int, height: int) -> Tuple[int, int, int, int]:
+        """
+        Get (new_w, new_h, y_offset, x_offset) to fit an image of given shape
+        centered into width x height, memoized per source and target size
+        """
+        h, w = shape[:2]
+        key = (h, w, width, height)
+        geometry = self._geometry_cache.get(key)
+        if geometry is None:
+            # Calculate scaling factor to fit within the desired dimensions
+            scale = min(width / w, height / h)
+            new_w = int(w * scale)
+            new_h = int(h * scale)
+            geometry = (new_w, new_h, (height - new_h) // 2, (width - new_w) // 2)
+            self._geometry_cache[key] = geometry
+        return geometry
     
-    def start_animation(self, callback, duration: float = 3.0):
+    def start_animation(self, callback, duration: float = 3.0, width: int = 160, height: int = 160):
         """
         Start playing the Live Photo animation for a specified duration
+        Frames are decoded and resized on a background thread
         """
         if not self.video_path:
             # If no video, just call the callback with static image
-            callback(self.get_static_preview())
+            callback(self.get_static_preview(width, height))
             return
         
+        self._stop_event.clear()
+        decode_thread = threading.Thread(target=self._decode_loop, args=(width, height), daemon=True)
+        decode_thread.start()
+        
+        frame_interval = 1.0 / 30  # ~30 FPS
         start_time = time.time()
-        while time.time() - start_time < duration and self.is_loaded:
-            frame = self.get_video_frame()
-            if frame is not None:
+        next_frame_time = start_time
+        try:
+            while time.time() - start_time < duration and self.is_loaded and not self._stop_event.is_set():
+                try:
+                    frame = self._frame_queue.get(timeout=frame_interval)
+                except queue.Empty:
+                    continue
                 callback(frame)
-            
-            # Small delay to control frame rate
-            time.sleep(1.0/30)  # ~30 FPS
+                
+                # Keep a steady frame rate regardless of decode time
+                next_frame_time += frame_interval
+                delay = next_frame_time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            self._stop_event.set()
+            decode_thread.join()
+            self._drain_frame_queue()
         
         # Reset video position when done
         self.player.reset_video_position()
     
+    def _decode_loop(self, width: int, height: int):
+        """
+        Decode and resize video frames into the frame queue until stopped
+        """
+        while not self._stop_event.is_set():
+            frame = self.get_video_frame(width, height)
+            if frame is None:
+                break
+            while not self._stop_event.is_set():
+                try:
+                    self._frame_queue.put(frame, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+    
+    def _drain_frame_queue(self):
+        """
+        Drop frames left over from a finished animation
+        """
+        while True:
+            try:
+                self._frame_queue.get_nowait()
+            except queue.Empty:
+                return
+    
     def stop_animation(self):
         """
         Stop the current animation
         """
-        pass  # Animation runs in main thread, no stopping needed
+        self._stop_event.set()
     
     def release(self):
         """
         Release all resources
         """
+        self.frames = None
         self.player.release()
-        self.is_loaded = False
\ No newline at end of file
+        self.is_loaded = False
+        self._reset_resize_cache()
+    
+    def _reset_resize_cache(self):
+        """
+        Drop cached resize geometry and buffers of the previous Live Photo
+        """
+        self._geometry_cache.clear()
+        self._static_previews.clear()
\ No newline at end of file
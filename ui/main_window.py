@@ -6,6 +6,7 @@ import sys
 import os
 from pathlib import Path
 import sqlite3
+from collections import deque
 from datetime import datetime
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
@@ -13,32 +14,55 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QStatusBar, QMenuBar, QMenu, QAction, QFileDialog,
                                QScrollArea, QMessageBox, QCalendarWidget, QLineEdit,
                                QToolBar)
-from PySide6.QtCore import Qt, QTimer, Signal, QObject, QThread
+from PySide6.QtCore import Qt, QTimer, Signal, QObject, QRunnable, QThreadPool
 from PySide6.QtGui import QPixmap, QIcon, QKeySequence, QActionGroup
 
 from core.importer import Importer
 from core.library import LibraryManager
 from core.exporter import Exporter
-from ui.preview_widget import PreviewWidget
+from ui.preview_widget import PreviewWidget, ThumbnailCachePruneTask
 from ui.drop_zone import DropZone
 
 
-class PhotoLoadingWorker(QThread):
+class PhotoLoadingSignals(QObject):
+    photos_batch = Signal(int, list)  # load token, photos
+
+
+class PhotoLoadingWorker(QRunnable):
     """
-    Worker thread for loading photos to avoid blocking the UI
+    Load photos on the thread pool to avoid blocking the UI
+    Rows are emitted in batches so the grid fills in progressively
     """
-    photos_loaded = Signal(list)
+    # Number of rows fetched and emitted at once
+    BATCH_SIZE = 512
     
-    def __init__(self, library_manager):
+    def __init__(self, library_manager, token: int, search=None):
         super().__init__()
         self.library_manager = library_manager
+        self.token = token
+        self.search = search
+        self.signals = PhotoLoadingSignals()
     
     def run(self):
-        photos = self.library_manager.get_all_photos()
-        self.photos_loaded.emit(photos)
+        # Pool threads expire when idle, so the connection only lives for this load
+        with self.library_manager.thread_connection():
+            cursor = self.library_manager.get_grid_rows(search=self.search)
+            while True:
+                photos = cursor.fetchmany(self.BATCH_SIZE)
+                if not photos:
+                    break
+                self.signals.photos_batch.emit(self.token, photos)
 
 
 class MainWindow(QMainWindow):
+    # Photo grid layout, the column count follows the window width
+    GRID_COLUMNS = 3
+    OVERSCAN_ROWS = 2
+    RESIZE_DEBOUNCE_MS = 100
+    
+    # Size budget of the on-disk thumbnail cache
+    THUMBNAIL_CACHE_BUDGET = 500 * 1024 * 1024
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("LiveVault - Live Photo Manager")
@@ -54,12 +78,40 @@ class MainWindow(QMainWindow):
         self.importer = Importer(str(self.library_path), str(self.db_path))
         self.exporter = Exporter(str(self.library_path), str(self.db_path), str(self.export_path))
         
+        # Library statistics shown in the status bar, re-read after imports
+        self._stats = self.library_manager.get_stats()
+        
         # Create necessary directories
         self.library_path.mkdir(parents=True, exist_ok=True)
         self.export_path.mkdir(parents=True, exist_ok=True)
         
+        # Persistent thumbnail cache, trimmed in the background
+        self.thumbnail_cache_path = self.app_data_path / 'thumbs'
+        self.thumbnail_cache_path.mkdir(parents=True, exist_ok=True)
+        PreviewWidget.thumbnail_cache_dir = str(self.thumbnail_cache_path)
+        QThreadPool.globalInstance().start(
+            ThumbnailCachePruneTask(str(self.thumbnail_cache_path), self.THUMBNAIL_CACHE_BUDGET)
+        )
+        
+        # Increased on every load, batches of older loads are ignored
+        self._load_token = 0
+        
         # Selected photos for batch operations
-        self.selected_photos = []
+        self.selected_photos: set[int] = set()
+        
+        # Virtualized photo grid: all records, widgets of visible cells, recycled widgets
+        self.photos = []
+        self.visible_widgets = {}
+        self.widget_pool = deque()
+        self.grid_row_count = 0
+        self.grid_columns = self.GRID_COLUMNS
+        
+        # One ~30 FPS timer drives the animation of all hovered Live Photos,
+        # it only runs while some widget is animating
+        self._animating = set()
+        self._anim_tick = QTimer(self)
+        self._anim_tick.setInterval(33)
+        self._anim_tick.timeout.connect(self._drive_animations)
         
         # Setup UI
         self.setup_ui()
@@ -88,6 +140,11 @@ class MainWindow(QMainWindow):
         self.search_input.setPlaceholderText("Search by filename...")
         self.search_input.textChanged.connect(self.on_search_changed)
         
+        # Search runs once typing pauses instead of on every keystroke
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.timeout.connect(self.load_photos)
+        
         self.calendar_button = QPushButton("Select Date Range")
         self.calendar_button.clicked.connect(self.open_calendar_dialog)
         
@@ -114,9 +171,26 @@ class MainWindow(QMainWindow):
         self.photo_grid = QGridLayout(self.grid_container)
         self.photo_grid.setAlignment(Qt.AlignLeft | Qt.AlignTop)
         
+        # Rows reserved with setRowMinimumHeight get no spacing, so all rows use
+        # the tile pitch and the gap comes from the tile's own margins
+        self.photo_grid.setVerticalSpacing(0)
+        
+        for col in range(self.grid_columns):
+            self.photo_grid.setColumnMinimumWidth(col, PreviewWidget.TILE_SIZE)
+        
+        # Columns are recomputed once resizing pauses
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.timeout.connect(self.reflow_grid)
+        
         self.scroll_area.setWidget(self.grid_container)
         main_layout.addWidget(self.scroll_area)
         
+        # Widgets are created only for rows scrolled into view
+        scroll_bar = self.scroll_area.verticalScrollBar()
+        scroll_bar.valueChanged.connect(self.update_visible_photos)
+        scroll_bar.rangeChanged.connect(self.update_visible_photos)
+        
         # Status bar
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
@@ -185,6 +259,7 @@ class MainWindow(QMainWindow):
         if folder_path:
             try:
                 count = self.importer.import_to_library(folder_path)
+                self.refresh_stats()
                 QMessageBox.information(self, "Import Complete", f"Successfully imported {count} Live Photos!")
                 self.load_photos()
             except Exception as e:
@@ -197,6 +272,7 @@ class MainWindow(QMainWindow):
         if dirs:
             try:
                 count = self.importer.import_to_library(dirs[0])
+                self.refresh_stats()
                 QMessageBox.information(self, "Import Complete", f"Successfully imported {count} Live Photos!")
                 self.load_photos()
             except Exception as e:
@@ -208,54 +284,198 @@ class MainWindow(QMainWindow):
     
     def load_photos(self):
         """Load photos from the library and display them"""
-        # Clear existing widgets in the grid
-        self.clear_photo_grid()
+        # Clear existing widgets in the grid, batches are appended as they arrive
+        self.display_photos([])
         
-        # Use worker thread to load photos
-        self.worker = PhotoLoadingWorker(self.library_manager)
-        self.worker.photos_loaded.connect(self.display_photos)
-        self.worker.start()
+        # Load photos on the thread pool
+        self._load_token += 1
+        search = self.search_input.text().strip() or None
+        worker = PhotoLoadingWorker(self.library_manager, self._load_token, search)
+        worker.signals.photos_batch.connect(self.on_photos_batch)
+        QThreadPool.globalInstance().start(worker)
+    
+    def on_photos_batch(self, token: int, photos):
+        """Add a batch of loaded photos unless a newer load has started"""
+        if token == self._load_token:
+            self.append_photos(photos)
     
     def clear_photo_grid(self):
-        """Clear all widgets from the photo grid"""
-        for i in reversed(range(self.photo_grid.count())):
-            widget = self.photo_grid.itemAt(i).widget()
-            if widget is not None:
-                widget.setParent(None)
+        """Clear all widgets from the photo grid, keeping them for reuse"""
+        if not self.visible_widgets:
+            return
+        
+        self.grid_container.setUpdatesEnabled(False)
+        try:
+            # The grid only holds visible widgets, take its items directly
+            # instead of looking each widget up in the layout
+            while (item := self.photo_grid.takeAt(0)) is not None:
+                preview_widget = item.widget()
+                if preview_widget is not None:
+                    preview_widget.hide()
+                    preview_widget.cleanup()
+                    self.widget_pool.append(preview_widget)
+            self.visible_widgets.clear()
+        finally:
+            self.grid_container.setUpdatesEnabled(True)
     
     def display_photos(self, photos):
         """Display photos in the grid"""
         # Clear existing widgets
         self.clear_photo_grid()
         
-        # Add photos to grid (3 per row for desktop app)
-        for i, photo in enumerate(photos):
-            row = i // 3
-            col = i % 3
+        # Only the photo records are kept, widgets are created for visible rows
+        self.photos = []
+        self.append_photos(photos)
+        
+        # Update status
+        self.update_status()
+    
+    def append_photos(self, photos):
+        """Add photos to the end of the grid"""
+        self.photos.extend(photos)
+        self.update_grid_rows()
+        self.update_visible_photos()
+    
+    def update_grid_rows(self):
+        """Reserve the height of all rows so the scrollbar covers the whole library"""
+        row_count = (len(self.photos) + self.grid_columns - 1) // self.grid_columns
+        for row in range(self.grid_row_count, row_count):
+            self.photo_grid.setRowMinimumHeight(row, PreviewWidget.TILE_SIZE)
+        for row in range(row_count, self.grid_row_count):
+            self.photo_grid.setRowMinimumHeight(row, 0)
+        self.grid_row_count = row_count
+    
+    def resizeEvent(self, event):
+        """Reflow the photo grid to the new width"""
+        super().resizeEvent(event)
+        self._resize_timer.start(self.RESIZE_DEBOUNCE_MS)
+    
+    def reflow_grid(self):
+        """Fit as many columns as the viewport width allows, moving existing widgets"""
+        spacing = max(0, self.photo_grid.horizontalSpacing())
+        width = self.scroll_area.viewport().width()
+        columns = max(1, (width + spacing) // (PreviewWidget.TILE_SIZE + spacing))
+        if columns == self.grid_columns:
+            return
+        
+        for col in range(max(columns, self.grid_columns)):
+            self.photo_grid.setColumnMinimumWidth(col, PreviewWidget.TILE_SIZE if col < columns else 0)
+        self.grid_columns = columns
+        
+        # Move the widgets to their new cells, thumbnails are kept as they are
+        self.grid_container.setUpdatesEnabled(False)
+        try:
+            for index, preview_widget in self.visible_widgets.items():
+                self.photo_grid.removeWidget(preview_widget)
+                self.photo_grid.addWidget(preview_widget, index // columns, index % columns)
+        finally:
+            self.grid_container.setUpdatesEnabled(True)
+        
+        self.update_grid_rows()
+        self.update_visible_photos()
+    
+    def update_visible_photos(self):
+        """Create preview widgets for rows in the viewport, recycle the others"""
+        if not self.photos:
+            return
+        
+        # Rows covered by the viewport plus a small overscan margin
+        row_height = PreviewWidget.TILE_SIZE
+        scroll_y = self.scroll_area.verticalScrollBar().value() - self.photo_grid.contentsMargins().top()
+        viewport_height = self.scroll_area.viewport().height()
+        first_row = max(0, scroll_y // row_height - self.OVERSCAN_ROWS)
+        last_row = (scroll_y + viewport_height) // row_height + self.OVERSCAN_ROWS
+        visible = range(first_row * self.grid_columns,
+                        min(len(self.photos), (last_row + 1) * self.grid_columns))
+        
+        hidden = [index for index in self.visible_widgets if index not in visible]
+        shown = [index for index in visible if index not in self.visible_widgets]
+        if not hidden and not shown:
+            return
+        
+        # Suspend painting while the batch is applied, then lay out once
+        viewport = self.scroll_area.viewport()
+        self.grid_container.setUpdatesEnabled(False)
+        viewport.setUpdatesEnabled(False)
+        try:
+            for index in hidden:
+                self.recycle_preview_widget(index)
             
-            # Create preview widget
-            preview_widget = PreviewWidget(
+            for index in shown:
+                photo = self.photos[index]
+                preview_widget = self.acquire_preview_widget(photo)
+                self.photo_grid.addWidget(preview_widget, index // self.grid_columns, index % self.grid_columns)
+                preview_widget.show()
+                self.visible_widgets[index] = preview_widget
+        finally:
+            viewport.setUpdatesEnabled(True)
+            self.grid_container.setUpdatesEnabled(True)
+        self.grid_container.updateGeometry()
+    
+    def acquire_preview_widget(self, photo) -> PreviewWidget:
+        """Get a preview widget for a photo, reusing a pooled one if possible"""
+        selected = photo['id'] in self.selected_photos
+        if self.widget_pool:
+            preview_widget = self.widget_pool.pop()
+            preview_widget.set_photo(
                 photo_id=photo['id'],
                 image_path=photo['filepath'],
                 has_video=bool(photo['has_video']),
-                timestamp=photo['timestamp']
+                timestamp=photo['timestamp'],
+                video_path=photo['video_path'],
+                file_size=photo['file_size'],
+                selected=selected
             )
-            preview_widget.photo_selected.connect(self.on_photo_selected)
-            preview_widget.photo_double_clicked.connect(self.on_photo_double_clicked)
-            
-            self.photo_grid.addWidget(preview_widget, row, col)
+            return preview_widget
         
-        # Update status
-        self.update_status()
+        # Create preview widget
+        preview_widget = PreviewWidget(
+            photo_id=photo['id'],
+            image_path=photo['filepath'],
+            has_video=bool(photo['has_video']),
+            timestamp=photo['timestamp'],
+            video_path=photo['video_path'],
+            file_size=photo['file_size'],
+            selected=selected
+        )
+        preview_widget.photo_selected.connect(self.on_photo_selected)
+        preview_widget.photo_double_clicked.connect(self.on_photo_double_clicked)
+        preview_widget.animation_requested.connect(self.on_animation_requested)
+        preview_widget.animation_stopped.connect(self.on_animation_stopped)
+        return preview_widget
+    
+    def recycle_preview_widget(self, index: int):
+        """Remove the widget of a grid cell and return it to the pool"""
+        preview_widget = self.visible_widgets.pop(index)
+        self.photo_grid.removeWidget(preview_widget)
+        preview_widget.hide()
+        preview_widget.cleanup()
+        self.widget_pool.append(preview_widget)
+    
+    def on_animation_requested(self, preview_widget):
+        """Start advancing the frames of a hovered Live Photo"""
+        self._animating.add(preview_widget)
+        if not self._anim_tick.isActive():
+            self._anim_tick.start()
+    
+    def on_animation_stopped(self, preview_widget):
+        """Stop advancing the frames of a Live Photo"""
+        self._animating.discard(preview_widget)
+        if not self._animating:
+            self._anim_tick.stop()
+    
+    def _drive_animations(self):
+        """Advance all animating widgets by one frame"""
+        # Widgets may stop, and leave the set, while being updated
+        for preview_widget in list(self._animating):
+            preview_widget.update_animation_frame()
     
     def on_photo_selected(self, photo_id, selected):
         """Handle photo selection/deselection"""
         if selected:
-            if photo_id not in self.selected_photos:
-                self.selected_photos.append(photo_id)
+            self.selected_photos.add(photo_id)
         else:
-            if photo_id in self.selected_photos:
-                self.selected_photos.remove(photo_id)
+            self.selected_photos.discard(photo_id)
     
     def on_photo_double_clicked(self, photo_id):
         """Handle double-click on a photo (show fullscreen)"""
@@ -266,16 +486,8 @@ class MainWindow(QMainWindow):
     
     def on_search_changed(self, text):
         """Handle search input changes"""
-        # Simple implementation - reload with search filter
-        self.clear_photo_grid()
-        
-        # In a real implementation, we'd want to filter on the worker thread
-        if text.strip():
-            photos = self.library_manager.search_photos(query=text)
-        else:
-            photos = self.library_manager.get_all_photos()
-        
-        self.display_photos(photos)
+        # Restart the debounce timer, the filtered grid is loaded on the worker thread
+        self._search_timer.start(200)
     
     def open_calendar_dialog(self):
         """Open calendar dialog for date range selection"""
@@ -290,7 +502,7 @@ class MainWindow(QMainWindow):
             return
         
         try:
-            success = self.exporter.export_photos(self.selected_photos)
+            success = self.exporter.export_photos(sorted(self.selected_photos))
             if success:
                 QMessageBox.information(
                     self, 
@@ -302,9 +514,19 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Export Error", f"Failed to export photos: {str(e)}")
     
+    def closeEvent(self, event):
+        """Release database connections when the window is closed"""
+        self.library_manager.close()
+        super().closeEvent(event)
+    
+    def refresh_stats(self):
+        """Re-read library statistics and show them"""
+        self._stats = self.library_manager.get_stats()
+        self.update_status()
+    
     def update_status(self):
         """Update the status bar with library statistics"""
-        stats = self.library_manager.get_stats()
+        stats = self._stats
         status_text = f"Storage: {stats['total_size_gb']} GB | {stats['live_photos']} live photos"
         self.status_bar.showMessage(status_text)
         
@@ -3,50 +3,157 @@ Preview widget for displaying Live Photos with animation capability
 Shows thumbnail with wave icon for Live Photos
 """
 import os
-from pathlib import Path
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Optional
 
+from PIL import Image
 from PySide6.QtWidgets import (QWidget, QLabel, QVBoxLayout, QHBoxLayout, 
                                QFrame, QCheckBox)
-from PySide6.QtCore import Qt, Signal, QTimer, QSize
-from PySide6.QtGui import QPixmap, QPainter, QColor, QFont, QPen
+from PySide6.QtCore import Qt, Signal, QTimer, QSize, QObject, QRunnable, QThreadPool
+from PySide6.QtGui import QPixmap, QPainter, QColor, QFont, QPen, QImage
 
 from core.playback import LivePhotoPreview
 
 
+class ThumbnailSignals(QObject):
+    done = Signal(int, bytes, int, int)  # photo_id, RGB888 data, width, height
+
+
+class ThumbnailTask(QRunnable):
+    """
+    Decode and downscale an image off the GUI thread
+    Only PIL is used here, Qt image types are created on the GUI thread
+    The thumbnail is also written to the on-disk cache if a path is given
+    """
+    def __init__(self, photo_id: int, image_path: str, size: int = 160,
+                 cache_path: Optional[str] = None):
+        super().__init__()
+        self.photo_id = photo_id
+        self.image_path = image_path
+        self.size = size
+        self.cache_path = cache_path
+        self.signals = ThumbnailSignals()
+    
+    def run(self):
+        try:
+            with Image.open(self.image_path) as img:
+                img.thumbnail((self.size, self.size), Image.LANCZOS)
+                img = img.convert("RGB")
+                if self.cache_path:
+                    self.save_to_cache(img)
+                self.signals.done.emit(self.photo_id, img.tobytes("raw", "RGB"), img.width, img.height)
+        except Exception:
+            self.signals.done.emit(self.photo_id, b"", 0, 0)
+    
+    def save_to_cache(self, img):
+        """Write the thumbnail atomically so readers never see a partial file"""
+        tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        try:
+            img.save(tmp_path, "WEBP", quality=80, method=4)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # The cache is an optimization, the thumbnail is still shown
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class FrameSignals(QObject):
+    done = Signal(int, object)  # photo_id, RGB frames array or None
+
+
+class FramePreloadTask(QRunnable):
+    """
+    Decode the animation frames of a Live Photo off the GUI thread
+    """
+    def __init__(self, photo_id: int, live_preview: LivePhotoPreview, size: int, max_frames: int):
+        super().__init__()
+        self.photo_id = photo_id
+        self.live_preview = live_preview
+        self.size = size
+        self.max_frames = max_frames
+        self.signals = FrameSignals()
+    
+    def run(self):
+        try:
+            frames = self.live_preview.decode_frames(self.size, self.size, self.max_frames)
+        except Exception:
+            frames = None
+        self.signals.done.emit(self.photo_id, frames)
+
+
+class ThumbnailCachePruneTask(QRunnable):
+    """
+    Trim the on-disk thumbnail cache to a size budget, least recently used first
+    """
+    def __init__(self, cache_dir: str, max_bytes: int):
+        super().__init__()
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+    
+    def run(self):
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                # Cache hits touch the file with os.utime, so mtime is the last use
+                files = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in entries if entry.is_file()]
+        except OSError:
+            return
+        
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
+
+
 class PreviewWidget(QFrame):
     photo_selected = Signal(int, bool)  # photo_id, selected
     photo_double_clicked = Signal(int)  # photo_id
     
-    def __init__(self, photo_id: int, image_path: str, has_video: bool, timestamp: str):
+    # Frames are advanced by a timer shared by all widgets, owned by the main window
+    animation_requested = Signal(object)  # widget
+    animation_stopped = Signal(object)  # widget
+    
+    # Grid cell size, slightly larger than the thumbnail to account for borders
+    TILE_SIZE = 170
+    
+    # Decoded thumbnails shared by all widgets, keyed by (image_path, file_size)
+    THUMBNAIL_CACHE_SIZE = 512
+    _thumbnail_cache = OrderedDict()
+    
+    # Directory of the persistent thumbnail cache, set by the main window
+    thumbnail_cache_dir: Optional[str] = None
+    
+    # Pixmaps drawn once and shared by all widgets
+    _wave_icon_cache: Optional[QPixmap] = None
+    _placeholder_cache: Optional[QPixmap] = None
+    
+    def __init__(self, photo_id: int, image_path: str, has_video: bool, timestamp: str,
+                 video_path: Optional[str] = None, file_size: Optional[int] = None,
+                 selected: bool = False):
         super().__init__()
         
-        self.photo_id = photo_id
-        self.image_path = image_path
-        self.has_video = has_video
-        self.timestamp = timestamp
-        
         # Animation related attributes
-        self.animation_timer = QTimer()
-        self.animation_timer.timeout.connect(self.update_animation_frame)
+        self.is_animating = False
         self.is_hovered = False
         self.is_selected = False
         self.animation_counter = 0
         self.max_animation_frames = 90  # At 30fps, this is 3 seconds
         
-        # Live photo preview object
-        self.live_preview = LivePhotoPreview()
+        # Live photo preview object, created on first hover of a photo with video
+        self.live_preview = None
         
         # Set up the UI
         self.setup_ui()
         
-        # Load the live photo if it has video
-        if self.has_video:
-            # Find the corresponding video file
-            video_path = self.find_video_path()
-            success = self.live_preview.load_live_photo(self.image_path, video_path)
-            if not success:
-                self.has_video = False  # Fallback to static image
-        
         # Set up event handling
         self.setMouseTracking(True)
         self.installEventFilter(self)
@@ -54,7 +161,8 @@ class PreviewWidget(QFrame):
         # Style the frame
         self.setFrameStyle(QFrame.StyledPanel | QFrame.Raised)
         self.setLineWidth(2)
-        self.update_style()
+        
+        self.set_photo(photo_id, image_path, has_video, timestamp, video_path, file_size, selected)
     
     def setup_ui(self):
         """Setup the UI elements for the preview widget"""
@@ -70,47 +178,124 @@ class PreviewWidget(QFrame):
         self.thumbnail_label.setFixedSize(160, 160)
         self.thumbnail_label.setMinimumSize(160, 160)
         
-        # Create initial thumbnail
-        self.create_thumbnail()
-        
         # Overlay for wave icon if it's a live photo
         self.overlay_label = QLabel()
         self.overlay_label.setParent(self.thumbnail_label)
         self.overlay_label.setGeometry(160 - 24, 160 - 24, 20, 20)  # Bottom right corner
         
-        if self.has_video:
-            # Draw a simple wave icon to indicate Live Photo
-            pixmap = self.create_wave_icon()
-            self.overlay_label.setPixmap(pixmap)
-            self.overlay_label.show()
-        else:
-            self.overlay_label.hide()
+        # Draw a simple wave icon to indicate Live Photo
+        self.overlay_label.setPixmap(PreviewWidget._get_wave_icon())
+        self.overlay_label.hide()
         
         layout.addWidget(self.thumbnail_label)
     
+    def set_photo(self, photo_id: int, image_path: str, has_video: bool, timestamp: str,
+                  video_path: Optional[str] = None, file_size: Optional[int] = None,
+                  selected: bool = False):
+        """Show a photo in this widget, also used when the grid recycles the widget"""
+        self.stop_animation()
+        if self.live_preview is not None:
+            if self._frames_loading:
+                # Still used by a preload task, let it go instead of releasing under it
+                self.live_preview = None
+            else:
+                self.live_preview.release()
+        
+        self.photo_id = photo_id
+        self.image_path = image_path
+        self.video_path = video_path
+        self.file_size = file_size
+        self.has_video = has_video and video_path is not None
+        self.timestamp = timestamp
+        self.is_selected = selected
+        self.is_hovered = False
+        self.animation_counter = 0
+        self._thumbnail_key = None
+        self._frames_loading = False
+        self._hover_delay_elapsed = False
+        
+        # Create initial thumbnail
+        self.create_thumbnail()
+        self.overlay_label.setVisible(self.has_video)
+        
+        # The animation frames are decoded on hover
+        if not self.has_video:
+            self.live_preview = None
+        
+        self.update_style()
+    
     def create_thumbnail(self):
-        """Create thumbnail from image file"""
-        if os.path.exists(self.image_path):
-            pixmap = QPixmap(self.image_path)
+        """
+        Show thumbnail of the image file
+        Decoding happens on the thread pool, a placeholder is shown meanwhile
+        """
+        if not self.image_path:
+            # Fallback: create a placeholder
+            self.thumbnail_label.setPixmap(self._get_placeholder_pixmap())
+            return
+        
+        # The path and size recorded in the database identify the image without a
+        # stat, a re-import over the same path changes the size, a missing file
+        # keeps the placeholder
+        key = (self.image_path, self.file_size)
+        pixmap = self._thumbnail_cache.get(key)
+        if pixmap is not None:
+            self._thumbnail_cache.move_to_end(key)
+            self.thumbnail_label.setPixmap(pixmap)
+            return
+        
+        # Persistent cache: a tiny decode instead of the full image
+        cache_path = None
+        if self.thumbnail_cache_dir is not None:
+            digest = blake2b(f"{self.image_path}|{self.file_size}|160".encode(), digest_size=8).hexdigest()
+            cache_path = os.path.join(self.thumbnail_cache_dir, f"{digest}.webp")
+            pixmap = QPixmap(cache_path)
             if not pixmap.isNull():
-                # Scale the image to fit within 160x160 while maintaining aspect ratio
-                scaled_pixmap = pixmap.scaled(
-                    160, 160, 
-                    Qt.KeepAspectRatio, 
-                    Qt.SmoothTransformation
-                )
-                self.thumbnail_label.setPixmap(scaled_pixmap)
-            else:
-                # Fallback: create a placeholder
-                pixmap = self.create_placeholder_pixmap()
+                try:
+                    os.utime(cache_path)  # Mark as recently used for pruning
+                except OSError:
+                    pass
+                self.add_to_thumbnail_cache(key, pixmap)
                 self.thumbnail_label.setPixmap(pixmap)
-        else:
-            # Fallback: create a placeholder
-            pixmap = self.create_placeholder_pixmap()
+                return
+        
+        self.thumbnail_label.setPixmap(self._get_placeholder_pixmap())
+        if self._thumbnail_key == key:
+            return  # Already being decoded
+        
+        self._thumbnail_key = key
+        task = ThumbnailTask(self.photo_id, self.image_path, cache_path=cache_path)
+        task.signals.done.connect(self.on_thumbnail_ready)
+        QThreadPool.globalInstance().start(task)
+    
+    def on_thumbnail_ready(self, photo_id: int, data: bytes, width: int, height: int):
+        """Show a thumbnail decoded on the thread pool"""
+        if photo_id != self.photo_id or self._thumbnail_key is None:
+            return  # Widget was reused for another photo meanwhile
+        key, self._thumbnail_key = self._thumbnail_key, None
+        if not data:
+            return  # Keep the placeholder
+        
+        image = QImage(data, width, height, 3 * width, QImage.Format_RGB888)
+        pixmap = QPixmap.fromImage(image)
+        self.add_to_thumbnail_cache(key, pixmap)
+        
+        # Keep showing the animation if it already started
+        if not self.is_animating:
             self.thumbnail_label.setPixmap(pixmap)
     
-    def create_placeholder_pixmap(self) -> QPixmap:
-        """Create a placeholder pixmap when image can't be loaded"""
+    def add_to_thumbnail_cache(self, key, pixmap: QPixmap):
+        """Remember a thumbnail in memory, evicting the least recently used"""
+        self._thumbnail_cache[key] = pixmap
+        if len(self._thumbnail_cache) > self.THUMBNAIL_CACHE_SIZE:
+            self._thumbnail_cache.popitem(last=False)
+    
+    @classmethod
+    def _get_placeholder_pixmap(cls) -> QPixmap:
+        """Get the placeholder pixmap shown when image can't be loaded"""
+        if cls._placeholder_cache is not None:
+            return cls._placeholder_cache
+        
         pixmap = QPixmap(160, 160)
         pixmap.fill(QColor(240, 240, 240))  # Light gray background
         
@@ -123,10 +308,15 @@ class PreviewWidget(QFrame):
         painter.drawText(pixmap.rect(), Qt.AlignCenter, "No Image")
         painter.end()
         
+        cls._placeholder_cache = pixmap
         return pixmap
     
-    def create_wave_icon(self) -> QPixmap:
-        """Create a small wave icon to indicate Live Photo"""
+    @classmethod
+    def _get_wave_icon(cls) -> QPixmap:
+        """Get the small wave icon indicating a Live Photo"""
+        if cls._wave_icon_cache is not None:
+            return cls._wave_icon_cache
+        
         pixmap = QPixmap(20, 20)
         pixmap.fill(Qt.transparent)
         
@@ -150,82 +340,103 @@ class PreviewWidget(QFrame):
             painter.drawLine(points[i][0], points[i][1], points[i+1][0], points[i+1][1])
         
         painter.end()
+        cls._wave_icon_cache = pixmap
         return pixmap
     
-    def find_video_path(self) -> str:
-        """Find the corresponding video file for this Live Photo"""
-        image_path_obj = Path(self.image_path)
-        base_name = image_path_obj.stem  # Filename without extension
-        
-        # Look for corresponding .MOV file in the same directory
-        video_candidates = [
-            image_path_obj.parent / f"{base_name}.MOV",
-            image_path_obj.parent / f"{base_name}.mov",
-        ]
-        
-        for candidate in video_candidates:
-            if candidate.exists():
-                return str(candidate)
-        
-        # If no MOV file found, return None
-        return None
-    
     def enterEvent(self, event):
         """Handle mouse entering the widget"""
         self.is_hovered = True
+        self._hover_delay_elapsed = False
         if self.has_video:
-            # Start animation after a short delay (to simulate the 400ms mentioned in spec)
-            QTimer.singleShot(400, self.start_animation_if_hovered)
+            # Decode right away, playback starts after a short delay
+            # (to simulate the 400ms mentioned in spec) once frames are ready
+            self.preload_frames()
+            QTimer.singleShot(400, self.on_hover_delay_elapsed)
         super().enterEvent(event)
     
     def leaveEvent(self, event):
         """Handle mouse leaving the widget"""
         self.is_hovered = False
-        if self.animation_timer.isActive():
-            self.animation_timer.stop()
+        if self.is_animating:
+            self.stop_animation()
             self.create_thumbnail()  # Revert to static image
+        
+        # Only the hovered widget keeps its frames in memory
+        if self.live_preview is not None:
+            self.live_preview.frames = None
         super().leaveEvent(event)
     
+    def preload_frames(self):
+        """Decode the animation frames on the thread pool"""
+        if self._frames_loading:
+            return
+        if self.live_preview is None:
+            self.live_preview = LivePhotoPreview()
+        
+        # Only the video is needed, the still image is already shown as thumbnail
+        self.live_preview.video_path = self.video_path
+        self._frames_loading = True
+        task = FramePreloadTask(self.photo_id, self.live_preview, 160, self.max_animation_frames)
+        task.signals.done.connect(self.on_frames_ready)
+        QThreadPool.globalInstance().start(task)
+    
+    def on_frames_ready(self, photo_id: int, frames):
+        """Start the animation once the frames are decoded, if still hovered"""
+        if photo_id != self.photo_id or self.live_preview is None:
+            return  # Widget was reused meanwhile
+        self._frames_loading = False
+        if frames is None:
+            self.has_video = False  # Fallback to static image
+            return
+        if self.is_hovered:
+            self.live_preview.frames = frames
+            self.start_animation_if_hovered()
+    
+    def on_hover_delay_elapsed(self):
+        """Allow the animation to start once the hover delay has passed"""
+        self._hover_delay_elapsed = True
+        self.start_animation_if_hovered()
+    
     def start_animation_if_hovered(self):
-        """Start animation if still hovered after delay"""
-        if self.is_hovered and self.has_video:
-            self.animation_counter = 0
-            self.animation_timer.start(33)  # ~30 FPS
+        """Start animation if still hovered after the delay and the frames are decoded"""
+        if not self.is_hovered or not self.has_video or self.is_animating or not self._hover_delay_elapsed:
+            return
+        if self.live_preview is None or self.live_preview.frames is None:
+            return  # on_frames_ready starts the animation
+        self.animation_counter = 0
+        self.is_animating = True
+        self.animation_requested.emit(self)
+    
+    def stop_animation(self):
+        """Stop receiving animation ticks"""
+        if self.is_animating:
+            self.is_animating = False
+            self.animation_stopped.emit(self)
     
     def update_animation_frame(self):
-        """Update the animation frame"""
+        """Update the animation frame, called on every tick of the shared animation timer"""
         if not self.is_hovered:
-            self.animation_timer.stop()
+            self.stop_animation()
             self.create_thumbnail()
             return
         
-        if self.has_video and self.live_preview.is_loaded:
-            frame = self.live_preview.get_video_frame(160, 160)
-            if frame is not None:
-                # Convert OpenCV BGR to RGB
-                height, width, channel = frame.shape
-                bytes_per_line = 3 * width
-                qt_image = self.convert_opencv_to_qpixmap(frame)
-                self.thumbnail_label.setPixmap(qt_image)
+        frames = self.live_preview.frames
+        if frames is None:
+            return  # Frames were released meanwhile
+        
+        # Frames are preloaded as RGB tiles, just wrap the current one
+        frame = frames[self.animation_counter]
+        height, width = frame.shape[:2]
+        qt_image = QImage(frame.data, width, height, 3 * width, QImage.Format_RGB888)
+        self.thumbnail_label.setPixmap(QPixmap.fromImage(qt_image))
         
         self.animation_counter += 1
         
-        # Stop after max frames (about 3 seconds at 30fps)
-        if self.animation_counter >= self.max_animation_frames:
-            self.animation_timer.stop()
+        # Stop after max frames (about 3 seconds at 30fps) or the end of the video
+        if self.animation_counter >= min(self.max_animation_frames, len(frames)):
+            self.stop_animation()
             self.create_thumbnail()  # Return to static image
     
-    def convert_opencv_to_qpixmap(self, cv_image) -> QPixmap:
-        """Convert OpenCV image to QPixmap"""
-        from PySide6.QtGui import QImage
-        # Convert BGR to RGB
-        rgb_image = cv_image[:, :, ::-1].copy()
-        
-        height, width, channel = rgb_image.shape
-        bytes_per_line = channel * width
-        q_img = QImage(rgb_image.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        return QPixmap.fromImage(q_img)
-    
     def mousePressEvent(self, event):
         """Handle mouse press events"""
         if event.button() == Qt.LeftButton:
@@ -249,15 +460,15 @@ class PreviewWidget(QFrame):
     
     def sizeHint(self):
         """Return preferred size for the widget"""
-        return QSize(170, 170)  # Slightly larger than the thumbnail to account for borders
+        return QSize(self.TILE_SIZE, self.TILE_SIZE)
     
     def minimumSizeHint(self):
         """Return minimum size for the widget"""
-        return QSize(170, 170)
+        return QSize(self.TILE_SIZE, self.TILE_SIZE)
     
     def cleanup(self):
         """Clean up resources when widget is destroyed"""
-        if self.animation_timer:
-            self.animation_timer.stop()
-        if self.live_preview:
+        self.stop_animation()
+        # A running preload task still uses the preview, set_photo drops it instead
+        if self.live_preview and not self._frames_loading:
             self.live_preview.release()
\ No newline at end of file